@@ -32,9 +32,16 @@
 # SOFTWARE.
 # ================================================================================== #
 
+import io
 import json
+import pickle
+import struct
 import sys
 
+_PACK_I = struct.Struct(">I")
+_CLASS_CACHE = {}
+_HIDDEN_BUILTIN_TYPES = {"NoneType": type(None), "ellipsis": type(...), "NotImplementedType": type(NotImplemented)}
+
 class Compatibility():
     """Provides simple methods to aid with compatibility."""
     def getVersion():
@@ -57,70 +64,60 @@ class Compatibility():
 class Utils():
    """Provides a set of general purpose utilities."""
    def getClass(moduleName, className):
-      """Returns the object for the class from the provided module."""
+      """Returns the object for the class from the provided module. Resolved classes are cached."""
+      objectClass = _CLASS_CACHE.get((moduleName, className))
+      if objectClass is not None:
+         return objectClass
+
       try:
-         return getattr(sys.modules[moduleName], className)
-      except KeyError:
+         if moduleName == "builtins" and className in _HIDDEN_BUILTIN_TYPES:
+            objectClass = _HIDDEN_BUILTIN_TYPES[className]
+         else:
+            objectClass = getattr(sys.modules[moduleName], className)
+      except (KeyError, AttributeError):
          raise TypeError("'%s' class definition doesn't exist in the '%s' module." % (className, moduleName))
 
+      _CLASS_CACHE[(moduleName, className)] = objectClass
+      return objectClass
+
 class DataUtils():
    """Provides a set of utilities for byte arrays."""
-   def addRawUtf16CharacterToUtf8ByteArray(array, character):
-      """Writes a UTF16 character into a UTF8 byte array by splitting it up into 2 characters. When combined, these characters will read as the original character."""
-      string = chr(character >> 8) + chr(character & 0xFF)
-      for char in string:
-         array.append(ord(char))
-   
    def addEscapedUtf16CharacterToUtf8ByteArray(array, character):
       """Writes a UTF16 character into a UTF8 byte array via the Unicode control character."""
-      string = f"\\u{character:04x}"
-      for char in string:
-         array.append(ord(char))
+      array.extend(f"\\u{character:04x}".encode("ascii"))
 
    def convertStringToUtf16Bytes(string):
-      """Converts the string into a UTF16 byte array."""
-      data = []
-      for value in Stream().map(lambda x: ord(x), string):
-         data.append(value >> 8)
-         data.append(value & 0xFF)
-      return data
+      """Converts the string into a big-endian UTF16 byte array."""
+      return bytearray(string.encode("utf-16-be"))
    
    def convertStringToUtf8Bytes(string):
       """Converts the string into a UTF8 byte array."""
-      data = []
-      for value in Stream().map(lambda x: ord(x), string):
-         if value > 255:
-            Utilities.addRawUtf16CharacterToUtf8ByteArray(data, value)
-         else:
-            data.append(value)
-      return data
+      return bytearray(string.encode("utf-8"))
 
    def convertListToString(byteData):
       """Converts a list of integers into a string via its character codes."""
-      return "".join(Stream().map(lambda x: chr(x), byteData))
-
-   def convertUtf16BytesToString(byteData):
-      """Converts a UTf16 byte array into a string by first converting it to a list of character codes."""
-      data = []
-      offset = 0
-
-      while len(byteData) - (offset * 2) > 0:
-         byte1 = byteData[offset * 2]
-         byte2 = byteData[(offset * 2) + 1]
+      try:
+         return DataUtils.convertByteListToString(byteData)
+      except ValueError:
+         return "".join(map(chr, byteData))
 
-         offset += 1
+   def convertByteListToString(byteData):
+      """Converts a list of bytes into a string via their character codes. All values must be between 0 and 255."""
+      return bytes(byteData).decode("latin-1")
 
-         data.append((byte1 << 8) + byte2)
-      
-      return DataUtils.convertListToString(data)
+   def convertUtf16BytesToString(byteData, errors = "replace"):
+      """Converts a big-endian UTF16 byte array into a string.\n'errors' - The codec error handler. By default malformed data is replaced with U+FFFD; pass "strict" to raise a UnicodeDecodeError instead."""
+      if not isinstance(byteData, (bytes, bytearray)):
+         byteData = bytes(byteData)
+      return byteData.decode("utf-16-be", errors=errors)
 
 class Stream():
-   """Offers functionality similar to Java's Stream class."""
+   """Offers functionality similar to Java's Stream class. Kept for API compatibility; ObjectIO no longer uses it internally."""
    def __init__(self, *results):
       self.results = []
       for x in results:
          if hasattr(x, "__iter__"):
-            self.results += list(x)
+            self.results.extend(x)
          else:
             self.results.append(x)
 
@@ -158,22 +155,20 @@ class Stream():
       """Maps the provides data using the provided function and stores it as the results.\n'function' - The function to be used to map the results.\n'data' - The data to be mapped. If no argument is provided, the already stored results will be used."""
       if data == None:
          data = self.results
-      self.results = list(map(function, list(data)))
+      self.results = list(map(function, data))
       return self
 
    def selectiveMap(self, filterFunction, mapFunction):
       """Maps only the stored data that passes the filter function provided.\n'filterFunction' - The function to filter the results.\n'mapFunction' - The function to be used for mapping."""
-      plist = Utilities.createEmbeddedList(range(0, len(self)), self)
-      Stream(plist).filterResults(lambda x: filterFunction(x[1])).forEach(lambda x: Stream.__setElementAt(self.results, x[0], mapFunction(x[1])))
+      results = self.results
+      for index, value in enumerate(results):
+         if filterFunction(value):
+            results[index] = mapFunction(value)
       return self
-
-   def __setElementAt(plist, index, newElement):
-      # Internal function so we can do an assignment operator in a lambda, normally not allowed.
-      plist[index] = newElement
    
    def addMapToResults(self, function, data):
       """Maps the provides data using the provided function and adds it the current results.\n'function' - The function to be used to map the results.\n'data' - The data to be mapped."""
-      self.results += list(map(function, list(data)))
+      self.results += list(map(function, data))
       return self
     
    def filter(self, function):
@@ -196,33 +191,43 @@ class Stream():
       self.results.clear()
       return self
 
+class _ObjectPickler(pickle.Pickler):
+   """Pickles an object graph, writing nested objects with stream hooks through the ObjectStream format."""
+   def persistent_id(self, obj):
+      if not isinstance(obj, type) and hasattr(obj, "writeToObjectStream") and hasattr(obj, "readFromObjectStream"):
+         stream = ObjectStream()
+         stream.writeObject(obj)
+         return stream.getBytes()
+      return None
+
+class _ObjectUnpickler(pickle.Unpickler):
+   """Unpickles an object graph written by _ObjectPickler."""
+   def persistent_load(self, pid):
+      return ObjectStream(pid).readObject()
+
 class ObjectStream():
    """Offers functionality similar to Java's ObjectInput and ObjectOutput classes."""
    def __init__(self, *data, readOnly = False):
-      self.data = []
+      self.data = bytearray()
       self.offset = 0
       for x in data:
          if hasattr(x, "__iter__"):
-            self.data += list(x)
+            self.data.extend(x)
          else:
             self.data.append(x)
 
    def __reserveBytes(self, amount, function):
       offset = len(self.data)
-
-      while amount > 0:
-         self.data.append(0)
-         amount -= 1
-
+      self.data.extend(bytes(amount))
       return lambda value: function(value, offset)
 
    def getBytes(self):
-      """Returns a list of all bytes that the stream is storing. The returned list is mutable, but not linked to the stream's internal list."""
-      return list(self.data)
+      """Returns all bytes that the stream is storing. The returned bytes are not linked to the stream's internal buffer."""
+      return bytes(self.data)
    
    def getRemainingBytes(self):
-      """Returns a list of all bytes that have not already been read by the stream."""
-      return self.data[self.offset:]
+      """Returns all bytes that have not already been read by the stream."""
+      return bytes(self.data[self.offset:])
    
    def getRemainingByteCount(self):
       """Returns the amount of free readable bytes."""
@@ -234,9 +239,6 @@ class ObjectStream():
 
    def writeByte(self, data, offset = -1):
       """Writes the byte to the end of the stream unless an argument is provided to specify the location."""
-      if data < 0 or data > 255:
-         raise ValueError("Expected byte, got %s" % data.__class__.__name__)
-      
       if offset == -1:
          self.data.append(data)
       else:
@@ -254,96 +256,100 @@ class ObjectStream():
 
    def writeBytes(self, byteData):
       """Writes all bytes in the list to the stream."""
-      for byte in byteData:
-         self.writeByte(byte)
+      self.data.extend(byteData)
 
    def readBytes(self, amount):
       """Reads the amount of bytes provided and advances the stream by that amount."""
-      data = self.data[self.offset:self.offset + amount]
+      data = bytes(self.data[self.offset:self.offset + amount])
       self.offset += len(data)
       return data
    
    def writeUtf8(self, string):
-      """Writes the string as a UTF8 string to the stream. UTF16 characters will be converted to 2 UTF8 characters. Data is terminated by a 0."""
-      self.data += DataUtils.convertStringToUtf8Bytes(string)
+      """Writes the string as a UTF8 string to the stream. Data is terminated by a 0."""
+      self.data.extend(string.encode("ascii") if string.isascii() else string.encode("utf-8"))
       self.data.append(0)
 
    def readUtf8(self):
-      """Reads the stream for a string until the reading is terminated by a '0' or until no bytes are available bytes are available."""
-      string = ""
-      
-      previousByte = self.readByte()
-      
-      if previousByte == 0:
-         return ""
-         
-      currentByte = self.readByte()
-
-      string = chr(previousByte)
-         
-      while self.getRemainingByteCount() > 0 and previousByte != 0 and currentByte != 0:
-         string += chr(currentByte)
-            
-         previousByte = currentByte
-         currentByte = self.readByte()
+      """Reads the stream for a string until the reading is terminated by a '0' or until no bytes are available. Data that isn't valid UTF8 is read as Latin-1 for compatibility with older streams. An IndexError is raised if the stream has no bytes left."""
+      if self.offset >= len(self.data):
+         raise IndexError("No bytes are available to read.")
 
+      end = self.data.find(0, self.offset)
+      if end == -1:
+         end = len(self.data)
+
+      data = self.data[self.offset:end]
+      try:
+         string = data.decode("ascii")
+      except UnicodeDecodeError:
+         try:
+            string = data.decode("utf-8")
+         except UnicodeDecodeError:
+            # Older streams stored characters up to 255 as single raw bytes.
+            string = data.decode("latin-1")
+      self.offset = min(end + 1, len(self.data))
       return string
 
    def writeUtf16(self, string):
       """Writes a string to the stream in UTF16 format. The data is terminated by two 0's."""
-      self.data += DataUtils.convertStringToUtf16Bytes(string)
+      self.data.extend(string.encode("utf-16-be"))
       self.data.append(0)
       self.data.append(0)
 
    def readUtf16(self, size = -1):
-      """Reads the stream for a string until the reading is terminated by 2 zeroes or until no bytes are available bytes are available. An error will be thrown if the data read is not a multiple of 2."""
+      """Reads the stream for a string until the reading is terminated by 2 zeroes or until no bytes are available. An error will be thrown if the data read is not a multiple of 2 or if the stream has no bytes left."""
       if size == -1:
-         byte = self.readByte()
-         zeroes = 0
-
-         data = []
-         
-         while self.getRemainingBytes() > 0 and zeroes < 2:
-            if byte == 0:
-               zeroes += 1
-            else:
-               zeroes = 0
-            
-            data.append(byte)
-            
-            byte = self.readByte()
+         if self.offset >= len(self.data):
+            raise IndexError("No bytes are available to read.")
 
-         # Remove trailing whitespace and fixing cursor.
-         data.pop()
-         data.pop()
-         self.offset -= 1
+         end = self.data.find(b"\x00\x00", self.offset)
 
-         return DataUtils.convertUtf16BytesToString(data)
+         # Only a zero character aligned to the start of the string terminates it.
+         while end != -1 and (end - self.offset) % 2:
+            end = self.data.find(b"\x00\x00", end + 1)
+         if end == -1:
+            end = len(self.data)
+
+         string = DataUtils.convertUtf16BytesToString(self.data[self.offset:end], "strict")
+         self.offset = min(end + 2, len(self.data))
+         return string
       else:
-         return DataUtils.convertListToString(self.readBytes(size))
+         return DataUtils.convertByteListToString(self.readBytes(size))
 
    def writeInt(self, integer, byteOffset = -1):
       """Writes an integer to the stream."""
-      for offset in range(0, 4):
-         if byteOffset == -1:
-            self.data.append((integer & 0xFF000000) >> 24)
-         else:
-            self.data[byteOffset + offset] = (integer & 0xFF000000) >> 24
-         integer = integer << 8
+      if byteOffset == -1:
+         self.data.extend(_PACK_I.pack(integer & 0xFFFFFFFF))
+      else:
+         _PACK_I.pack_into(self.data, byteOffset, integer & 0xFFFFFFFF)
 
    def readInt(self, byteOffset = -1):
       """Reads the next 4-bytes in the stream to return an integer."""
-      integer = 0
-      for offset in range(0, 4):
-         integer = integer << 8
+      try:
          if byteOffset == -1:
-            integer += self.readByte()
+            integer = _PACK_I.unpack_from(self.data, self.offset)[0]
+            self.offset += 4
          else:
-            integer += self.readByte(byteOffset + offset)
+            integer = _PACK_I.unpack_from(self.data, byteOffset)[0]
+      except struct.error:
+         raise IndexError("Not enough bytes are available to read an integer.")
       return integer
+
+   def writeIntArray(self, integers):
+      """Writes all integers in the list to the stream, equivalent to calling writeInt for each one."""
+      self.data.extend(struct.pack(">%dI" % len(integers), *(integer & 0xFFFFFFFF for integer in integers)))
+
+   def readIntArray(self, amount):
+      """Reads the amount of integers provided and advances the stream by that amount."""
+      try:
+         integers = list(struct.unpack_from(">%dI" % amount, self.data, self.offset))
+      except struct.error:
+         raise IndexError("Not enough bytes are available to read %s integers." % amount)
+      self.offset += amount * 4
+      return integers
    
    def writeObject(self, obj):
-      """Writes an entire object to the stream and additional meta-data required to reconstruct the object later on."""
+      """Writes an entire object to the stream and additional meta-data required to reconstruct the object later on. Objects defining writeToObjectStream and readFromObjectStream are written through those methods, including when nested inside other objects."""
 
       if self == obj:
          raise RecursionError("The stream cannot write itself to its stream.")
@@ -357,22 +363,17 @@ class ObjectStream():
       if hasattr(obj, "writeToObjectStream") and hasattr(obj, "readFromObjectStream"):
          obj.writeToObjectStream(self)
       else:
-         if hasattr(obj, "__dict__"):
-            self.writeByte(1) # Byte flag of 1 indicates that the object relies on a dictionary attribute.
-            metadata = vars(obj)
-            self.writeInt(len(metadata))
-            
-            for variable, value in metadata.items():
-               self.writeUtf8(variable)
-               self.writeObject(value)
-         else:
-            self.writeByte(0) # Byte flag of 0 indicates that the object doesn't have a dictionary attribute. Generally indicates generic variables like integers.
-            self.writeUtf8(json.dumps(obj))
+         self.writeByte(2) # Byte flag of 2 indicates that the object is stored as a length-prefixed pickle.
+         buffer = io.BytesIO()
+         _ObjectPickler(buffer, protocol=5).dump(obj)
+         blob = buffer.getvalue()
+         self.writeInt(len(blob))
+         self.data.extend(blob)
 
       writeSizeFunction(len(self.data) - currentSize)
 
    def readObject(self):
-      """Reconstructs an object from the stream based on meta data and object data in the stream."""
+      """Reconstructs an object from the stream based on meta data and object data in the stream. Only read streams from trusted sources, as objects are restored with pickle."""
       moduleName = self.readUtf8()
       className = self.readUtf8()
       version = self.readByte()
@@ -387,7 +388,10 @@ class ObjectStream():
          newObject = objectClass()
          newObject.readFromObjectStream(self)
       else:
-         if self.readByte() == 0:
+         flag = self.readByte()
+         if flag == 2:
+            newObject = _ObjectUnpickler(io.BytesIO(self.readBytes(self.readInt()))).load()
+         elif flag == 0:
             newObject = json.loads(self.readUtf8())
          else:
             newObject = objectClass()
@@ -411,9 +415,9 @@ class ObjectStream():
 
    def readFromObjectStream(self, stream):
       """Instantiates this object from the provided stream."""
-      version = self.readByte()
+      version = stream.readByte()
       self.offset = stream.readInt()
-      self.data = stream.readBytes(stream.readInt())
+      self.data = bytearray(stream.readBytes(stream.readInt()))
 
 if __name__ == "__main__":
    print("[ObjectIO %s] by Ryan Jones @ 2019" % Compatibility.getVersionString())
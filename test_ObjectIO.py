@@ -0,0 +1,90 @@
+import unittest
+
+from ObjectIO import ObjectStream
+
+class Point():
+   def __init__(self):
+      self.x = 0
+
+class Hooked():
+   def __init__(self):
+      self.value = 0
+
+   def writeToObjectStream(self, stream):
+      stream.writeInt(self.value)
+
+   def readFromObjectStream(self, stream):
+      self.value = stream.readInt()
+
+class IntTest(unittest.TestCase):
+   def testWriteIntMatchesBigEndianBytes(self):
+      for value in (0, -1, 0xFFFFFFFF, 2**40 + 5):
+         stream = ObjectStream()
+         stream.writeInt(value)
+         self.assertEqual(int.from_bytes(stream.getBytes()[-4:], "big"), value & 0xFFFFFFFF)
+         self.assertEqual(stream.readInt(), value & 0xFFFFFFFF)
+
+   def testReadIntPastEndRaisesIndexError(self):
+      stream = ObjectStream(0, 0, 1)
+      with self.assertRaises(IndexError):
+         stream.readInt()
+
+class StringTest(unittest.TestCase):
+   def testUtf8RoundTrip(self):
+      stream = ObjectStream()
+      stream.writeUtf8("café")
+      stream.writeUtf8("")
+      self.assertEqual(stream.readUtf8(), "café")
+      self.assertEqual(stream.readUtf8(), "")
+      with self.assertRaises(IndexError):
+         stream.readUtf8()
+
+   def testUtf16RoundTrip(self):
+      stream = ObjectStream()
+      stream.writeUtf16("Ā\u0001\U0001F600")
+      self.assertEqual(stream.readUtf16(), "Ā\u0001\U0001F600")
+      with self.assertRaises(IndexError):
+         stream.readUtf16()
+
+   def testReadsLegacyLatin1String(self):
+      stream = ObjectStream(b"caf\xe9\x00")
+      self.assertEqual(stream.readUtf8(), "café")
+
+class ObjectTest(unittest.TestCase):
+   def testNoneRoundTrip(self):
+      stream = ObjectStream()
+      stream.writeObject(None)
+      self.assertIsNone(stream.readObject())
+
+   def testNestedHookedObjectRoundTrip(self):
+      point = Point()
+      point.x = Hooked()
+      point.x.value = 7
+      stream = ObjectStream()
+      stream.writeObject(point)
+      result = stream.readObject()
+      self.assertIsInstance(result.x, Hooked)
+      self.assertEqual(result.x.value, 7)
+
+   def testUnresolvableClassRaisesTypeError(self):
+      stream = ObjectStream()
+      stream.writeUtf8("notloaded_mod")
+      stream.writeUtf8("Hooked")
+      stream.writeByte(0)
+      stream.writeInt(5)
+      stream.writeByte(2)
+      stream.writeInt(0)
+      with self.assertRaises(TypeError):
+         stream.readObject()
+
+   def testReadsLegacyDictionaryStream(self):
+      # Point with x = 1, as written by the recursive attribute format (flag 1) holding a JSON value (flag 0).
+      stream = ObjectStream(
+         b"test_ObjectIO\x00Point\x00\x00\x00\x00\x00\x1c\x01\x00\x00\x00\x01x\x00"
+         b"builtins\x00int\x00\x00\x00\x00\x00\x03\x001\x00")
+      result = stream.readObject()
+      self.assertIsInstance(result, Point)
+      self.assertEqual(result.x, 1)
+
+if __name__ == "__main__":
+   unittest.main()